@@ -3,13 +3,25 @@ import requests
 from datetime import datetime, timedelta
 import time
 import pytz
-import pandas as pd
+from archive_merge import merge_archive, normalize_event_id_val
 import io
-import re
-import ftplib  # ✅ FTPアップロード機能用
-import concurrent.futures
-import streamlit.components.v1 as components
-
+import os
+import csv
+import hashlib
+import base64
+import json
+import logging
+import unicodedata
+import threading
+from collections import OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+# ※ pandas / ftplib / concurrent.futures / streamlit.components は起動を軽くするため、
+#   必要になる関数の中でだけ import する（コールドスタート対策）
+
+
+logger = logging.getLogger(__name__)
 
 # 日本時間(JST)のタイムゾーンを設定
 JST = pytz.timezone('Asia/Tokyo')
@@ -17,123 +29,55 @@ JST = pytz.timezone('Asia/Tokyo')
 # --- 定数定義 ---
 # APIリクエスト時に使用するヘッダー
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"}
+# SHOWROOM API / mksoul の接続先（負荷試験でローカルのスタブに向ける場合は SR_SHOWROOM_BASE_URL / SR_MKSOUL_BASE_URL を指定）
+SHOWROOM_BASE_URL = os.environ.get("SR_SHOWROOM_BASE_URL", "https://www.showroom-live.com")
+MKSOUL_BASE_URL = os.environ.get("SR_MKSOUL_BASE_URL", "https://mksoul-pro.com")
 # イベント検索APIのURL
-API_EVENT_SEARCH_URL = "https://www.showroom-live.com/api/event/search"
+API_EVENT_SEARCH_URL = f"{SHOWROOM_BASE_URL}/api/event/search"
 # イベントルームリストAPIのURL（参加ルーム数取得用）
-API_EVENT_ROOM_LIST_URL = "https://www.showroom-live.com/api/event/room_list"
+API_EVENT_ROOM_LIST_URL = f"{SHOWROOM_BASE_URL}/api/event/room_list"
 # SHOWROOMのイベントページのベースURL
 EVENT_PAGE_BASE_URL = "https://www.showroom-live.com/event/"
 # MKsoulルームリスト
-ROOM_LIST_URL = "https://mksoul-pro.com/showroom/file/room_list.csv"
+ROOM_LIST_URL = f"{MKSOUL_BASE_URL}/showroom/file/room_list.csv"
 # 過去イベントデータファイルのURLを格納しているインデックスファイルのURL
-PAST_EVENT_INDEX_URL = "https://mksoul-pro.com/showroom/file/sr-event-archive-list-index.txt"
-
-
-# ===============================
-# 📱 共通レスポンシブCSS（スマホ／タブレット対応）
-# ===============================
-st.markdown("""
-<style>
-/* ---------- テーブル共通 ---------- */
-table {
-    width: 100%;
-    border-collapse: collapse;
-    font-size: 14px;
-}
-
-/* ---------- ボタンリンク ---------- */
-.rank-btn-link {
-    background: #0b57d0;
-    color: white !important;
-    border: none;
-    padding: 4px 8px;
-    border-radius: 4px;
-    cursor: pointer;
-    text-decoration: none;
-    display: inline-block;
-    font-size: 12px;
-}
-.rank-btn-link:hover {
-    background: #0949a8;
-}
-
-/* ---------- 横スクロール対応 ---------- */
-.table-wrapper {
-    overflow-x: auto;
-    -webkit-overflow-scrolling: touch;
-    border: 1px solid #ddd;
-    border-radius: 6px;
-    width: 100%;
-}
-
-/*
-.room-name-ellipsis {
-    max-width: 250px;
-    white-space: nowrap;
-    overflow: hidden;
-    text-overflow: ellipsis;
-    display: inline-block;
-}
-*/
-
-/* ---------- スマホ・タブレット対応 ---------- */
-@media screen and (max-width: 1024px) {
-    table {
-        font-size: 12px !important;
-    }
-    th, td {
-        padding: 6px !important;
-    }
-    .rank-btn-link {
-        padding: 6px 8px !important;
-        font-size: 13px !important;
-    }
-    .table-wrapper {
-        overflow-x: auto !important;
-        display: block !important;
-    }
-    /* 固定幅で横スクロール可能にする */
-    .table-wrapper table {
-        width: 1080px !important;
-    }
-}
-</style>
-""", unsafe_allow_html=True)
+PAST_EVENT_INDEX_URL = f"{MKSOUL_BASE_URL}/showroom/file/sr-event-archive-list-index.txt"
+# 公開スナップショット（参加ルーム数を解決済みの現在のイベント一覧）の配置先
+SNAPSHOT_FTP_PATH = "/mksoul-pro.com/showroom/file/sr-event-snapshot.json"
+SNAPSHOT_VERSION_FTP_PATH = "/mksoul-pro.com/showroom/file/sr-event-snapshot-version.txt"
+SNAPSHOT_URL = f"{MKSOUL_BASE_URL}/showroom/file/sr-event-snapshot.json"
+SNAPSHOT_VERSION_URL = f"{MKSOUL_BASE_URL}/showroom/file/sr-event-snapshot-version.txt"
+# スナップショットのバージョンを確認する間隔（秒）
+SNAPSHOT_POLL_TTL = 60
+# これより古いスナップショットは使わずにAPIから直接取得する（秒）。
+# API取得時のキャッシュ（EVENT_LIST_TTL）と同じ鮮度にそろえる。
+# スナップショットはアーカイブ更新とは別に publish_snapshot.py でこれより短い間隔で公開し直す
+SNAPSHOT_MAX_AGE = 600
+# スナップショットに含めるイベントのステータス（開催中・開催予定・終了）
+SNAPSHOT_STATUSES = (1, 3, 4)
+# イベント一覧（取得結果）のキャッシュ有効期限（秒）
+EVENT_LIST_TTL = 600
+# フィルタ結果キャッシュの最大保持件数（LRU）
+RESULT_CACHE_MAX_ENTRIES = 64
+# フィルタ結果キャッシュの有効期限（秒）。参加ルーム数はライブ値のため、スナップショットが同じでも一定時間で作り直す
+RESULT_CACHE_TTL = 300
+# 開催中イベントの参加ルーム数を記録する間隔（秒）
+ENTRY_SAMPLE_INTERVAL = 600
+# 1イベントあたりの最大サンプル数（超えたら間引いて解像度を半分にする）
+ENTRY_SERIES_MAX_SAMPLES = 288
+# 記録対象とするイベント数の上限（超えたら最も更新の古いものから破棄）
+ENTRY_SERIES_MAX_EVENTS = 2000
+# バックグラウンドのサンプラーを起動するか（負荷試験などで外部アクセスを止める場合は SR_ENTRY_SAMPLER=0）
+ENTRY_SAMPLER_ENABLED = os.environ.get("SR_ENTRY_SAMPLER", "1") != "0"
+ENTRY_SAMPLER_THREAD_NAME = "entry-sampler"
+# 一覧に表示する推移（スパークライン）の期間（秒）と点数
+ENTRY_TREND_WINDOW = 86400
+ENTRY_TREND_POINTS = 12
+# アーカイブ更新を実行するスレッドの名前と、画面側で進捗を確認する間隔（秒）
+ARCHIVE_UPDATE_THREAD_NAME = "archive-update"
+ARCHIVE_UPDATE_POLL_INTERVAL = 1
 
 
-
-# --- ヘルパー: event_id 正規化関数（変更点） ---
-def normalize_event_id_val(val):
-    """
-    event_id の型ゆれ（数値、文字列、'123.0' など）を吸収して
-    一貫した文字列キーを返す。
-    戻り値: 正規化された文字列 (例: "123")、無効なら None を返す
-    """
-    if val is None:
-        return None
-    try:
-        # numpy / pandas の数値型も扱えるよう float にして判定
-        # ただし 'abc' のような文字列はそのまま文字列化して返す
-        if isinstance(val, (int,)):
-            return str(val)
-        if isinstance(val, float):
-            if val.is_integer():
-                return str(int(val))
-            return str(val).strip()
-        s = str(val).strip()
-        # もし "123.0" のような表記なら整数に変換して整数表記で返す
-        if re.match(r'^\d+(\.0+)?$', s):
-            return str(int(float(s)))
-        # 普通の数字文字列やキー文字列はトリムしたものを返す
-        if s == "":
-            return None
-        return s
-    except Exception:
-        try:
-            return str(val).strip()
-        except Exception:
-            return None
-
 # --- データ取得関数 ---
 
 
@@ -144,6 +88,7 @@ def ftp_upload(file_path, content_bytes):
     ftp_host = st.secrets["ftp"]["host"]
     ftp_user = st.secrets["ftp"]["user"]
     ftp_pass = st.secrets["ftp"]["password"]
+    import ftplib  # ✅ FTPアップロード機能用（使用時のみ読み込む）
     with ftplib.FTP(ftp_host) as ftp:
         ftp.login(ftp_user, ftp_pass)
         with io.BytesIO(content_bytes) as f:
@@ -155,6 +100,7 @@ def ftp_download(file_path):
     ftp_host = st.secrets["ftp"]["host"]
     ftp_user = st.secrets["ftp"]["user"]
     ftp_pass = st.secrets["ftp"]["password"]
+    import ftplib  # ✅ FTPアップロード機能用（使用時のみ読み込む）
     with ftplib.FTP(ftp_host) as ftp:
         ftp.login(ftp_user, ftp_pass)
         buffer = io.BytesIO()
@@ -166,14 +112,23 @@ def ftp_download(file_path):
             return None
 
 
-def update_archive_file():
-    """全イベントを取得→必要項目を抽出→重複除外→sr-event-archive.csvを上書き→ログ追記＋DL"""
+def run_archive_update(progress):
+    """
+    全イベントを取得→必要項目を抽出→重複除外→sr-event-archive.csvを上書き→ログ追記→スナップショット公開。
+    画面表示は行わず、進捗は progress（(進捗率 0.0〜1.0, メッセージ) を受け取る関数）に通知します。
+    ArchiveUpdateJob のバックグラウンドスレッドから呼び出します。
+    戻り値: {"added_count", "after_count", "csv_bytes", "finished_at", "snapshot", "snapshot_error"}
+    """
+    import pandas as pd
+
     JST = pytz.timezone('Asia/Tokyo')
     now_str = datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S")
 
-    st.info("📡 イベントデータを取得中...")
+    progress(0.0, "📡 イベントデータを取得中...")
     statuses = [1, 3, 4]
-    new_events = get_events(statuses)
+    # スナップショットの generated_at に取得時刻を使うため、キャッシュを通さずに取得する
+    fetched_at = int(time.time())
+    new_events = fetch_events(statuses)
 
     # ✅ 必要な9項目だけ抽出
     filtered_events = []
@@ -195,8 +150,7 @@ def update_archive_file():
 
     new_df = pd.DataFrame(filtered_events)
     if new_df.empty:
-        st.warning("有効なイベントデータが取得できませんでした。")
-        return
+        raise RuntimeError("有効なイベントデータが取得できませんでした。")
 
     # event_id正規化
     new_df["event_id"] = new_df["event_id"].apply(normalize_event_id_val)
@@ -204,24 +158,24 @@ def update_archive_file():
     new_df.drop_duplicates(subset=["event_id"], inplace=True)
 
     # 既存バックアップを取得
-    st.info("💾 FTPサーバー上の既存バックアップを取得中...")
+    progress(0.1, "💾 FTPサーバー上の既存バックアップを取得中...")
     existing_csv = ftp_download("/mksoul-pro.com/showroom/file/sr-event-archive.csv")
     if existing_csv:
         old_df = pd.read_csv(io.StringIO(existing_csv), dtype=str)
-        old_df["event_id"] = old_df["event_id"].apply(normalize_event_id_val)
     else:
         old_df = pd.DataFrame(columns=new_df.columns)
 
-    # 結合＋重複除外
-    merged_df = pd.concat([old_df, new_df], ignore_index=True)
+    # 結合＋重複除外（event_id 正規化と CSV 化を含む。大きなアーカイブはプロセスプールで並列処理）
+    merged_df, csv_bytes = merge_archive(
+        old_df, new_df,
+        progress=lambda value, message: progress(0.2 + 0.6 * value, f"🔀 {message}"),
+    )
     before_count = len(old_df)
-    merged_df.drop_duplicates(subset=["event_id"], keep="last", inplace=True)
     after_count = len(merged_df)
     added_count = after_count - before_count  # ←このままでOK（マイナスも許容）
 
     # 上書きアップロード
-    st.info("☁️ FTPサーバーへアップロード中...")
-    csv_bytes = merged_df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+    progress(0.8, "☁️ FTPサーバーへアップロード中...")
     ftp_upload("/mksoul-pro.com/showroom/file/sr-event-archive.csv", csv_bytes)
 
     # ログ追記
@@ -231,21 +185,176 @@ def update_archive_file():
         log_text = existing_log + log_text
     ftp_upload("/mksoul-pro.com/showroom/file/sr-event-archive-log.txt", log_text.encode("utf-8"))
 
-    st.success(f"✅ バックアップ更新完了: {added_count}件追加（合計 {after_count}件）")
+    # ✅ 同じ取得結果から閲覧用スナップショットも公開
+    progress(0.9, "📦 公開用スナップショットを作成中...")
+    snapshot, snapshot_error = None, None
+    try:
+        snapshot = publish_event_snapshot(new_events, fetched_at)
+    except Exception as e:
+        logger.exception("スナップショットの公開に失敗しました")
+        snapshot_error = str(e)
+
+    progress(1.0, "✅ 更新完了")
+    return {
+        "added_count": added_count,
+        "after_count": after_count,
+        "csv_bytes": csv_bytes,
+        "finished_at": datetime.now(JST),
+        "snapshot": snapshot,
+        "snapshot_error": snapshot_error,
+    }
 
-    # ✅ 更新完了後にダウンロードボタン追加
-    st.download_button(
-        label="📥 更新後のバックアップCSVをダウンロード",
-        data=csv_bytes,
-        file_name=f"sr-event-archive_{datetime.now(JST).strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv"
-    )
 
+class ArchiveUpdateJob:
+    """
+    アーカイブ更新（run_archive_update）をバックグラウンドスレッドで実行し、進捗と結果を保持します。
+    マージなどの重い処理の間もセッションの操作を止めないよう、画面側は status() で状態を参照するだけにします。
+    セッション間で共有されるため、状態はロックで保護します。
+    """
 
-@st.cache_data(ttl=600)  # 10分間キャッシュを保持
-def get_events(statuses):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {"status": "idle", "progress": 0.0, "message": "", "result": None, "error": None}
+
+    def start(self):
+        """
+        更新を開始し、開始したかどうかを返します。キャッシュのクリアでジョブが作り直されても
+        二重に実行しないよう、スレッド名で実行中かどうかを判定します（プロセスにつき1つ）。
+        """
+        with self._lock:
+            if any(t.name == ARCHIVE_UPDATE_THREAD_NAME and t.is_alive() for t in threading.enumerate()):
+                return False
+            self._state = {"status": "running", "progress": 0.0, "message": "開始しています...", "result": None, "error": None}
+            threading.Thread(target=self._run, name=ARCHIVE_UPDATE_THREAD_NAME, daemon=True).start()
+        return True
+
+    def status(self):
+        """現在の状態のコピーを返す（status は idle / running / done / error）"""
+        with self._lock:
+            return dict(self._state)
+
+    def _report(self, value, message):
+        with self._lock:
+            self._state.update(progress=min(max(value, 0.0), 1.0), message=message)
+
+    def _run(self):
+        try:
+            result = run_archive_update(self._report)
+        except Exception as e:
+            logger.exception("アーカイブの更新に失敗しました")
+            with self._lock:
+                self._state.update(status="error", error=str(e))
+            return
+        with self._lock:
+            self._state.update(status="done", progress=1.0, result=result)
+
+
+@st.cache_resource
+def get_archive_update_job():
+    """全セッションで共有するアーカイブ更新ジョブを返す"""
+    return ArchiveUpdateJob()
+
+
+@st.fragment(run_every=ARCHIVE_UPDATE_POLL_INTERVAL)
+def render_archive_update_status():
+    """アーカイブ更新の進捗・結果を表示（この部分だけを一定間隔で再実行し、画面全体の操作は止めない）"""
+    state = get_archive_update_job().status()
+    if state["status"] == "running":
+        st.progress(state["progress"], text=state["message"])
+    elif state["status"] == "error":
+        st.warning(f"アーカイブの更新中にエラーが発生しました: {state['error']}")
+    elif state["status"] == "done":
+        result = state["result"]
+        st.success(f"✅ バックアップ更新完了: {result['added_count']}件追加（合計 {result['after_count']}件）")
+        snapshot = result["snapshot"]
+        if snapshot is not None:
+            st.success(
+                f"✅ スナップショット公開完了: {snapshot['rows']}件"
+                f"（{snapshot['size'] // 1024}KB, version {snapshot['version']}）"
+            )
+        else:
+            st.warning(f"スナップショットの公開中にエラーが発生しました: {result['snapshot_error']}")
+
+        # ✅ 更新完了後にダウンロードボタン追加
+        st.download_button(
+            label="📥 更新後のバックアップCSVをダウンロード",
+            data=result["csv_bytes"],
+            file_name=f"sr-event-archive_{result['finished_at'].strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+
+
+def update_archive_file():
+    """アーカイブ更新をバックグラウンドで開始し、進捗と結果を表示します（実行中なら進捗の表示のみ）"""
+    if not get_archive_update_job().start():
+        st.info("アーカイブ更新は実行中です。")
+    render_archive_update_status()
+
+
+def publish_event_snapshot(events, fetched_at):
+    """
+    現在のイベント一覧（参加ルーム数を解決済み）を列指向の JSON スナップショットとして公開します。
+    閲覧側はバージョンファイルを確認し、変わったときだけスナップショット本体を読み込みます。
+    fetched_at には events を API から取得した時刻（UNIX 秒）を渡し、generated_at として記録します
+    （閲覧側は generated_at で鮮度を判定するため、公開時刻ではなく取得時刻を使う）。
+    戻り値: {"version", "rows", "size"}
     """
-    指定されたステータスのイベントリストをAPIから取得します。
+    import concurrent.futures
+
+    unique_events = {}
+    for e in events:
+        eid = normalize_event_id_val(e.get("event_id"))
+        if eid is not None:
+            unique_events[eid] = e
+    event_ids = list(unique_events)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        totals = list(executor.map(get_total_entries, event_ids))
+
+    columns = [
+        "event_id", "event_name", "event_url_key", "is_entry_scope_inner",
+        "started_at", "ended_at", "status", "total_entries",
+    ]
+    rows = []
+    for eid, total in zip(event_ids, totals):
+        e = unique_events[eid]
+        rows.append([
+            eid, e.get("event_name"), e.get("event_url_key"), bool(e.get("is_entry_scope_inner")),
+            e.get("started_at"), e.get("ended_at"), e.get("_fetched_status"), total,
+        ])
+
+    generated_at = int(fetched_at)
+    rows_json = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+    version = f"{generated_at}-{hashlib.sha1(rows_json.encode('utf-8')).hexdigest()[:12]}"
+    payload = json.dumps(
+        {"version": version, "generated_at": generated_at, "columns": columns, "rows": rows},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+    # 本体を先にアップロードし、最後にバージョンを更新する（閲覧側が未アップロードの本体を読まないように）
+    ftp_upload(SNAPSHOT_FTP_PATH, payload)
+    ftp_upload(SNAPSHOT_VERSION_FTP_PATH, version.encode("utf-8"))
+    return {"version": version, "rows": len(rows), "size": len(payload)}
+
+
+def run_snapshot_publish():
+    """
+    閲覧用スナップショットだけを作り直して公開します（publish_snapshot.py から定期実行する入口）。
+    アーカイブの FTP ダウンロード・マージ・ログ追記は行いません。
+    いずれかのステータスが1件も取得できなかった場合は公開せず例外を送出します
+    （一部が欠けたスナップショットで上書きせず、閲覧側は期限切れ後に API からの取得に戻る）。
+    """
+    fetched_at = int(time.time())
+    events = fetch_events(SNAPSHOT_STATUSES)
+    fetched_statuses = {e.get("_fetched_status") for e in events}
+    missing = [status for status in SNAPSHOT_STATUSES if status not in fetched_statuses]
+    if missing:
+        raise RuntimeError(f"イベントデータが取得できませんでした (status={missing})")
+    return publish_event_snapshot(events, fetched_at)
+
+
+def fetch_events(statuses):
+    """
+    指定されたステータスのイベントリストをAPIから取得します（キャッシュなし）。
     変更点: 各イベント辞書に取得元ステータスを示すキー '_fetched_status' を追加します。
     """
     all_events = []
@@ -286,6 +395,12 @@ def get_events(statuses):
     return all_events
 
 
+@st.cache_data(ttl=EVENT_LIST_TTL)  # 10分間キャッシュを保持
+def get_events(statuses):
+    """指定されたステータスのイベントリストを取得します（fetch_events の結果をキャッシュ）。"""
+    return fetch_events(statuses)
+
+
 
 @st.cache_data(ttl=600)
 def get_past_events_from_files():
@@ -294,13 +409,15 @@ def get_past_events_from_files():
     これまでのインデックス方式ではなく、
     固定ファイル https://mksoul-pro.com/showroom/file/sr-event-archive.csv を直接読み込む。
     """
+    import pandas as pd
+
     all_past_events = pd.DataFrame()
     column_names = [
         "event_id", "is_event_block", "is_entry_scope_inner", "event_name",
         "image_m", "started_at", "ended_at", "event_url_key", "show_ranking"
     ]
 
-    fixed_csv_url = "https://mksoul-pro.com/showroom/file/sr-event-archive.csv"
+    fixed_csv_url = f"{MKSOUL_BASE_URL}/showroom/file/sr-event-archive.csv"
 
     try:
         response = requests.get(fixed_csv_url, headers=HEADERS, timeout=10)
@@ -341,6 +458,71 @@ def get_past_events_from_files():
     return all_past_events.to_dict('records')
 
 
+@st.cache_data(ttl=SNAPSHOT_POLL_TTL)
+def get_snapshot_version():
+    """公開スナップショットの現在のバージョンを取得（無い場合は None）"""
+    try:
+        # 中間キャッシュで古いバージョンが返らないよう、確認間隔ごとにクエリを変える
+        params = {"t": int(time.time() // SNAPSHOT_POLL_TTL)}
+        response = requests.get(SNAPSHOT_VERSION_URL, headers=HEADERS, params=params, timeout=5)
+        if response.status_code != 200:
+            return None
+        version = response.content.decode("utf-8").strip()
+        return version or None
+    except requests.exceptions.RequestException:
+        return None
+
+
+@st.cache_resource(max_entries=2)
+def load_event_snapshot(version):
+    """
+    指定バージョンの公開スナップショットを読み込み、イベント辞書のリストに展開します。
+    検索インデックスもここで全イベント分を1度だけ構築し、全セッション・全ステータスで共有します。
+    読み込みに失敗した場合は例外を送出します（失敗結果をキャッシュしないため）。
+    """
+    response = requests.get(SNAPSHOT_URL, headers=HEADERS, params={"v": version}, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("version") != version:
+        raise ValueError(f"スナップショットのバージョンが一致しません: {data.get('version')} != {version}")
+    columns = data["columns"]
+    events = []
+    for row in data["rows"]:
+        e = dict(zip(columns, row))
+        e["_fetched_status"] = e.pop("status", None)
+        e["total_entries_result"] = e.pop("total_entries", 0)
+        events.append(e)
+    return {
+        "version": version,
+        "generated_at": data["generated_at"],
+        "events": events,
+        "search_index": EventSearchIndex(events),
+    }
+
+
+def get_event_status_at(event, now_ts):
+    """開始・終了日時から、指定時刻におけるステータス（1: 開催中 / 3: 開催予定 / 4: 終了）を返す"""
+    if now_ts < event.get("started_at", 0):
+        return 3
+    if now_ts < event.get("ended_at", 0):
+        return 1
+    return 4
+
+
+def get_published_snapshot():
+    """利用可能な公開スナップショットを返す（無い・古すぎる場合は None でAPI取得にフォールバック）"""
+    version = get_snapshot_version()
+    if version is None:
+        return None
+    try:
+        snapshot = load_event_snapshot(version)
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+        return None
+    if  time.time() - snapshot["generated_at"] > SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
+
+
 #@st.cache_data(ttl=300)  # 5分間キャッシュを保持
 def get_total_entries(event_id):
     """
@@ -368,7 +550,7 @@ def get_total_entries(event_id):
 @st.cache_data(ttl=300)
 def fetch_room_list_page(event_id: str, page: int):
     """1ページ分の room_list を取得（キャッシュ対象）"""
-    url = f"https://www.showroom-live.com/api/event/room_list?event_id={event_id}&p={page}"
+    url = f"{API_EVENT_ROOM_LIST_URL}?event_id={event_id}&p={page}"
     try:
         res = requests.get(url, headers=HEADERS, timeout=10)
         if res.status_code == 200:
@@ -398,6 +580,619 @@ def get_duration_category(start_ts, end_ts):
         return "その他"
 
 
+# --- フィルタ結果キャッシュ ---
+def compute_snapshot_version(events):
+    """
+    イベント一覧（重複除外後）の内容からスナップショットのバージョン文字列を算出します。
+    表示に影響する項目が1つでも変われば別バージョンになります。
+    """
+    digest = hashlib.sha1()
+    for e in events:
+        row = [
+            e.get("event_id"), e.get("event_name"), e.get("event_url_key"),
+            e.get("started_at"), e.get("ended_at"), bool(e.get("is_entry_scope_inner")),
+        ]
+        digest.update(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def collect_event_dates(events):
+    """開始日・終了日フィルタの選択肢となる日付の集合を返す"""
+    start_dates = {datetime.fromtimestamp(e['started_at'], JST).date() for e in events if 'started_at' in e}
+    end_dates = {datetime.fromtimestamp(e['ended_at'], JST).date() for e in events if 'ended_at' in e}
+    return start_dates, end_dates
+
+
+@st.cache_resource(ttl=EVENT_LIST_TTL, max_entries=16)
+def get_event_list(statuses, snapshot_version=None):
+    """
+    選択ステータスのイベント一覧を取得し、event_id 正規化・重複除外・バージョン算出・
+    日付フィルタの選択肢の算出までを取得1回につき1度だけ行い、全セッションで共有します。
+    返却値のイベント辞書は共有されるため、書き換える場合はコピーしてから行うこと。
+    """
+    if snapshot_version is not None:
+        snapshot = load_event_snapshot(snapshot_version)
+        # 公開時点のステータスは古くなるため、開始・終了日時から現在のステータスを判定し直す
+        now_ts = time.time()
+        fetched_events = []
+        for e in snapshot["events"]:
+            status = get_event_status_at(e, now_ts)
+            if status in statuses:
+                fetched_events.append(dict(e, _fetched_status=status))
+    else:
+        fetched_events = fetch_events(list(statuses))
+
+    # 辞書を使って重複を確実に排除
+    unique_events_dict = {}
+    for event in fetched_events:
+        # --- 変更: event_id を正規化して辞書キーにする ---
+        eid = normalize_event_id_val(event.get('event_id'))
+        if eid is None:
+            # 無効なIDはスキップ
+            continue
+        if event.get('event_id') != eid:
+            event = dict(event, event_id=eid)
+        # フェッチ元（API）を優先して格納（上書き可）
+        unique_events_dict[eid] = event
+
+    # ✅ 特定イベントを完全除外（フィルタ候補にも残らないように）
+    events = [e for e in unique_events_dict.values() if e["event_id"] != "12151"]
+
+    version = compute_snapshot_version(events)
+    if snapshot_version is not None:
+        # 参加ルーム数もスナップショットに含まれるため、公開バージョンもキーに含める
+        version = f"{snapshot_version}:{version}"
+    start_dates, end_dates = collect_event_dates(events)
+    # 検索インデックスは取得時にまとめて構築する（スナップショットは全イベント分を共有し、
+    # 検索結果は後段で表示対象のイベントと突き合わせる）
+    if snapshot_version is not None:
+        search_index = snapshot["search_index"]
+    else:
+        search_index = EventSearchIndex(events)
+    return {
+        "version": version,
+        "events": events,
+        "search_index": search_index,
+        "raw_count": len(fetched_events),
+        "start_dates": start_dates,
+        "end_dates": end_dates,
+    }
+
+
+class FilterResultCache:
+    """
+    フィルタ条件ごとの描画結果（絞り込み後の event_id 一覧・HTML・CSV）を保持する LRU キャッシュ。
+    セッション間で共有されるため、操作はロックで保護します。
+    scope（取得ステータスの組み合わせ）ごとにスナップショットのバージョンを管理し、
+    バージョンが変わった時点でその scope のエントリを破棄します。
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _sync_version(self, scope, version):
+        # ロック取得済みの状態で呼び出すこと
+        if self._versions.get(scope) != version:
+            for key in [k for k in self._entries if k[0] == scope]:
+                del self._entries[key]
+            self._versions[scope] = version
+
+    def get(self, scope, version, filters):
+        """キャッシュ済みの結果を返す（無い・期限切れの場合は None）"""
+        key = (scope, filters)
+        with self._lock:
+            self._sync_version(scope, version)
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, scope, version, filters, value):
+        """結果を格納し、上限を超えた分は古いものから削除"""
+        key = (scope, filters)
+        with self._lock:
+            self._sync_version(scope, version)
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def get_filter_result_cache():
+    """全セッションで共有するフィルタ結果キャッシュを返す"""
+    return FilterResultCache()
+
+
+# --- イベント名検索（n-gram インデックス） ---
+def normalize_search_text(text):
+    """検索用に文字列を正規化（全角・半角の統一と小文字化）"""
+    return unicodedata.normalize("NFKC", str(text or "")).lower()
+
+
+class EventSearchIndex:
+    """
+    event_name / event_url_key を対象にした文字 n-gram（1〜3文字）の転置インデックス。
+    単語分割を行わないため日本語でもそのまま部分一致検索ができます。
+    ポスティングはイベント番号の配列（昇順）で保持します。
+    """
+
+    def __init__(self, events):
+        self.event_ids = []
+        self._texts = []
+        postings = {}
+        for i, e in enumerate(events):
+            text = normalize_search_text(e.get("event_name")) + "\n" + normalize_search_text(e.get("event_url_key"))
+            self.event_ids.append(e.get("event_id"))
+            self._texts.append(text)
+            grams = set(text)
+            grams.update(text[j:j + 2] for j in range(len(text) - 1))
+            grams.update(text[j:j + 3] for j in range(len(text) - 2))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: array("I", ids) for gram, ids in postings.items()}
+
+    def search(self, query):
+        """部分一致するイベントの event_id の集合を返す"""
+        q = normalize_search_text(query).strip()
+        if not q:
+            return set(self.event_ids)
+        if len(q) <= 3:
+            return {self.event_ids[i] for i in self._postings.get(q, ())}
+
+        # クエリ中の3文字 n-gram のうち最も件数の少ないポスティングを候補にして、実際の部分一致で確定する
+        candidates = None
+        for j in range(len(q) - 2):
+            posting = self._postings.get(q[j:j + 3])
+            if posting is None:
+                return set()
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+        texts = self._texts
+        return {self.event_ids[i] for i in candidates if q in texts[i]}
+
+
+@st.cache_resource(max_entries=8)
+def get_event_search_index(snapshot_version, _events):
+    """「終了(BU)」を含む一覧など、取得結果に計算済みのインデックスが無い場合に1度だけ構築して共有"""
+    return EventSearchIndex(_events)
+
+
+# --- 参加ルーム数の推移（時系列ストア） ---
+class EntrySeries:
+    """
+    1イベント分の参加ルーム数の時系列。
+    タイムスタンプは直前のサンプルとの差分（秒）で保持し、配列で省メモリに格納します。
+    """
+    __slots__ = ("base_ts", "last_ts", "deltas", "values")
+
+    def __init__(self):
+        self.base_ts = 0
+        self.last_ts = 0
+        self.deltas = array("I")
+        self.values = array("i")
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, ts, value):
+        if not self.values:
+            self.base_ts = ts
+            self.deltas.append(0)
+        else:
+            self.deltas.append(ts - self.last_ts)
+        self.values.append(value)
+        self.last_ts = ts
+
+    def timestamps(self):
+        """差分を復元した絶対タイムスタンプのリスト"""
+        return list(accumulate(self.deltas, initial=self.base_ts))[1:]
+
+    def compact(self):
+        """1つおきに間引いて解像度を半分にする（最新のサンプルは必ず残す）"""
+        ts_list = self.timestamps()
+        keep = list(range(0, len(ts_list), 2))
+        if keep[-1] != len(ts_list) - 1:
+            keep.append(len(ts_list) - 1)
+        values = self.values
+        self.deltas = array("I")
+        self.values = array("i")
+        for i in keep:
+            self.append(ts_list[i], values[i])
+
+
+class EntrySeriesStore:
+    """
+    開催中イベントの参加ルーム数を追記専用で記録するストア。
+    イベント数・サンプル数ともに上限を持ち、メモリ使用量が一定以内に収まるようにします。
+    """
+
+    def __init__(self, interval=ENTRY_SAMPLE_INTERVAL, max_samples=ENTRY_SERIES_MAX_SAMPLES,
+                 max_events=ENTRY_SERIES_MAX_EVENTS):
+        self.interval = interval
+        self.max_samples = max_samples
+        self.max_events = max_events
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, event_id, value, ts=None):
+        """
+        サンプルを1件追記します。前回の記録から interval 秒経っていない場合や、
+        値が数値でない（'N/A' など）場合は記録せず False を返します。
+        """
+        if not isinstance(value, int) or isinstance(value, bool):
+            return False
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            series = self._series.get(event_id)
+            if series is None:
+                if len(self._series) >= self.max_events:
+                    oldest = min(self._series, key=lambda k: self._series[k].last_ts)
+                    del self._series[oldest]
+                series = self._series[event_id] = EntrySeries()
+            elif ts - series.last_ts < self.interval:
+                return False
+            series.append(ts, value)
+            if len(series) > self.max_samples:
+                series.compact()
+            return True
+
+    def range(self, event_id, start_ts, end_ts):
+        """start_ts〜end_ts のサンプルを (タイムスタンプ, 値) のリストで返す"""
+        with self._lock:
+            series = self._series.get(event_id)
+            if series is None:
+                return []
+            ts_list = series.timestamps()
+            lo = bisect_left(ts_list, start_ts)
+            hi = bisect_right(ts_list, end_ts)
+            return list(zip(ts_list[lo:hi], series.values[lo:hi]))
+
+    def downsample(self, event_id, start_ts, end_ts, points):
+        """
+        start_ts〜end_ts を points 個の区間に分け、各区間の最後の値を返します。
+        サンプルの無い区間は直前の値で埋めます（先頭側は None）。
+        """
+        samples = self.range(event_id, start_ts, end_ts)
+        if not samples or points <= 0:
+            return []
+        width = max(1, (end_ts - start_ts) / points)
+        result = [None] * points
+        for ts, value in samples:
+            result[min(points - 1, int((ts - start_ts) / width))] = value
+        last = None
+        for i, value in enumerate(result):
+            if value is None:
+                result[i] = last
+            else:
+                last = value
+        return result
+
+    def growth_rate(self, event_id, window=ENTRY_TREND_WINDOW, now=None):
+        """直近 window 秒の1時間あたり増加数を返す（サンプル不足なら None）"""
+        now = int(now if now is not None else time.time())
+        samples = self.range(event_id, now - window, now)
+        if len(samples) < 2 or samples[-1][0] == samples[0][0]:
+            return None
+        (t0, v0), (t1, v1) = samples[0], samples[-1]
+        return (v1 - v0) * 3600 / (t1 - t0)
+
+    def prune(self, active_event_ids):
+        """開催中でなくなったイベントの時系列を破棄"""
+        active = set(active_event_ids)
+        with self._lock:
+            for event_id in [k for k in self._series if k not in active]:
+                del self._series[event_id]
+
+
+def is_ongoing_event(event, now_ts=None):
+    """開催中（status=1 で取得、かつ現在が開催期間内）のイベントか判定"""
+    now_ts = now_ts if now_ts is not None else time.time()
+    return (
+        event.get("_fetched_status") == 1
+        and event.get("started_at", 0) <= now_ts < event.get("ended_at", 0)
+    )
+
+
+def run_entry_sampler():
+    """
+    開催中イベントの参加ルーム数を一定間隔で記録し続ける（バックグラウンドスレッド用）。
+    キャッシュのクリアでストアが作り直されても追従できるよう、周期ごとに現在のストアを取得します。
+    """
+    import concurrent.futures
+
+    while True:
+        store = get_entry_series_store()
+        try:
+            # 一覧表示（開催中）と同じ取得結果を共有し、サンプラー独自の巡回を増やさない
+            snapshot = get_published_snapshot()
+            event_list = get_event_list((1,), snapshot["version"] if snapshot else None)
+            event_ids = [e["event_id"] for e in event_list["events"] if is_ongoing_event(e)]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+                totals = list(executor.map(get_total_entries, event_ids))
+            now_ts = int(time.time())
+            for eid, total in zip(event_ids, totals):
+                store.record(eid, total, now_ts)
+            store.prune(event_ids)
+        except Exception:
+            # 取得失敗時は次の周期で再試行する（失敗が続いていることはログで分かるようにする）
+            logger.exception("参加ルーム数のサンプリングに失敗しました")
+        time.sleep(store.interval)
+
+
+def start_entry_sampler():
+    """
+    サンプラーのスレッドをプロセスにつき1つだけ起動します。
+    Streamlit はスクリプトを再実行のたびに評価し直すため、モジュール変数ではなく
+    スレッド名で起動済みかどうかを判定します。
+    """
+    if any(t.name == ENTRY_SAMPLER_THREAD_NAME and t.is_alive() for t in threading.enumerate()):
+        return
+    threading.Thread(target=run_entry_sampler, name=ENTRY_SAMPLER_THREAD_NAME, daemon=True).start()
+
+
+@st.cache_resource
+def get_entry_series_store():
+    """全セッションで共有する時系列ストアを返す（サンプラーが未起動なら起動）"""
+    store = EntrySeriesStore()
+    if ENTRY_SAMPLER_ENABLED:
+        start_entry_sampler()
+    return store
+
+
+def render_sparkline(values):
+    """数値リストをブロック文字のスパークラインに変換"""
+    values = [v for v in values if v is not None]
+    if len(values) < 2:
+        return ""
+    blocks = "▁▂▃▄▅▆▇█"
+    lo, hi = min(values), max(values)
+    if hi == lo:
+        return blocks[0] * len(values)
+    return "".join(blocks[(v - lo) * (len(blocks) - 1) // (hi - lo)] for v in values)
+
+
+def format_entry_trend(store, event, now_ts):
+    """一覧の「増加ペース」列の表示内容（スパークライン＋1時間あたり増加数）"""
+    if not is_ongoing_event(event, now_ts):
+        return "-"
+    eid = event["event_id"]
+    spark = render_sparkline(store.downsample(eid, now_ts - ENTRY_TREND_WINDOW, now_ts, ENTRY_TREND_POINTS))
+    rate = store.growth_rate(eid, now=now_ts)
+    if rate is None:
+        return spark or "-"
+    return f"{spark} {rate:+.1f}/h".strip()
+
+
+# --- 一覧表示の生成 ---
+def build_download_csv(events):
+    """一覧のCSVデータ（utf-8-sig のバイト列）を生成"""
+    # pandas の to_csv と同じ出力（QUOTE_MINIMAL / 改行 \n）を標準の csv モジュールで生成し、
+    # 一覧表示の経路で pandas を読み込まないようにする
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["イベント名", "対象", "開始", "終了", "参加ルーム数"])
+    for e in events:
+        writer.writerow([
+            e['event_name'],
+            "対象者限定" if e.get("is_entry_scope_inner") else "全ライバー",
+            datetime.fromtimestamp(e["started_at"], JST).strftime('%Y/%m/%d %H:%M'),
+            datetime.fromtimestamp(e["ended_at"], JST).strftime('%Y/%m/%d %H:%M'),
+            e.get("total_entries_result", 0),
+        ])
+
+    # 前に「大丈夫そう」と言っていただいた「utf-8-sig」のエンコードをそのまま使用
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def build_summary_html(events, csv_bytes, trend_store=None):
+    """
+    一覧テーブルとCSVダウンロードボタンを一体化したHTMLを生成。
+    trend_store を渡した場合は「増加ペース」列（参加ルーム数の推移）を追加します。
+    """
+    b64_csv = base64.b64encode(csv_bytes).decode()
+    now_ts = int(time.time())
+    trend_header = "\n                  <th>増加ペース</th>" if trend_store is not None else ""
+
+    # --- テーブルとボタンを一体化して隙間を無くす ---
+    html = f"""
+    <style>
+    .summary-wrapper {{
+        max-height: 80vh;
+        overflow-y: auto;
+        border: 1px solid #d1d5db;
+        /* 下のボタンとの間に少しだけ余白を作る場合はここ */
+        margin-bottom: 0px;
+    }}
+    .summary-table {{
+        width: 100%;
+        border-collapse: separate;
+        border-spacing: 0;
+        font-size: 0.85rem;
+        font-family: sans-serif;
+    }}
+
+    /* --- 【修正】表の一番下の線がダブるのを防ぐ --- */
+    .summary-table tbody tr:last-child td {{
+        border-bottom: none;
+    }}
+
+    .summary-table thead th {{
+        background: #f3f4f6;
+        text-align: center;
+        padding: 10px 12px;
+        border-bottom: 1px solid #d1d5db;
+        border-right: 1px solid #d1d5db;
+        position: sticky;
+        top: 0;
+        z-index: 10;
+        white-space: nowrap;
+    }}
+    .summary-table tbody td {{
+        padding: 8px 12px;
+        border-bottom: 1px solid #e5e7eb;
+        border-right: 1px solid #e5e7eb;
+        white-space: nowrap;
+    }}
+    .summary-table td:first-child {{
+        white-space: normal;
+        min-width: 250px;
+    }}
+    .summary-table tbody td.col-center {{
+        text-align: center;
+    }}
+    .summary-table thead th:last-child,
+    .summary-table tbody td:last-child {{
+        border-right: none;
+    }}
+
+    /* --- 【修正】ボタンの位置の微調整 --- */
+    .dl-link {{
+        display: inline-flex;
+        align-items: center;
+        padding: 0.4rem 0.8rem;
+        border-radius: 0.5rem;
+        color: #31333F;
+        background-color: #FFFFFF;
+        border: 1px solid #d1d5db;
+        text-decoration: none;
+        font-size: 0.85rem;
+        font-family: sans-serif;
+
+        /* ここで表との距離を調整します（10px程度が標準的です） */
+        margin-top: 12px;
+    }}
+    .dl-link:hover {{
+        border-color: #FF4B4B;
+        color: #FF4B4B;
+    }}
+    </style>
+
+    <div class="summary-wrapper">
+        <table class="summary-table">
+            <thead>
+                <tr>
+                  <th>イベント名</th>
+                  <th>対象</th>
+                  <th>開始</th>
+                  <th>終了</th>
+                  <th>参加ルーム数</th>{trend_header}
+                </tr>
+            </thead>
+            <tbody>
+    """
+
+    rows = []
+    for e in events:
+        trend_cell = ""
+        if trend_store is not None:
+            trend_cell = f"""\n              <td class="col-center">{format_entry_trend(trend_store, e, now_ts)}</td>"""
+        rows.append(f"""
+            <tr>
+              <td><a href="{EVENT_PAGE_BASE_URL}{e['event_url_key']}" target="_blank">{e['event_name']}</a></td>
+              <td class="col-center">{"対象者限定" if e.get("is_entry_scope_inner") else "全ライバー"}</td>
+              <td class="col-center">{datetime.fromtimestamp(e["started_at"], JST).strftime('%Y/%m/%d %H:%M')}</td>
+              <td class="col-center">{datetime.fromtimestamp(e["ended_at"], JST).strftime('%Y/%m/%d %H:%M')}</td>
+              <td class="col-center">{e.get("total_entries_result", 0)}</td>{trend_cell}
+            </tr>
+        """)
+    html += "".join(rows)
+
+    html += f"""
+            </tbody>
+        </table>
+    </div>
+    <a class="dl-link" href="data:text/csv;base64,{b64_csv}" download="event_list.csv">
+        📊 この内容をCSVでダウンロード
+    </a>
+    """
+    return html
+
+
+# ===============================
+# 📱 共通レスポンシブCSS（スマホ／タブレット対応）
+# ===============================
+def inject_common_css():
+    """共通CSSをページに埋め込む（import 時ではなく main() から呼び出す）"""
+    st.markdown("""
+<style>
+/* ---------- テーブル共通 ---------- */
+table {
+    width: 100%;
+    border-collapse: collapse;
+    font-size: 14px;
+}
+
+/* ---------- ボタンリンク ---------- */
+.rank-btn-link {
+    background: #0b57d0;
+    color: white !important;
+    border: none;
+    padding: 4px 8px;
+    border-radius: 4px;
+    cursor: pointer;
+    text-decoration: none;
+    display: inline-block;
+    font-size: 12px;
+}
+.rank-btn-link:hover {
+    background: #0949a8;
+}
+
+/* ---------- 横スクロール対応 ---------- */
+.table-wrapper {
+    overflow-x: auto;
+    -webkit-overflow-scrolling: touch;
+    border: 1px solid #ddd;
+    border-radius: 6px;
+    width: 100%;
+}
+
+/*
+.room-name-ellipsis {
+    max-width: 250px;
+    white-space: nowrap;
+    overflow: hidden;
+    text-overflow: ellipsis;
+    display: inline-block;
+}
+*/
+
+/* ---------- スマホ・タブレット対応 ---------- */
+@media screen and (max-width: 1024px) {
+    table {
+        font-size: 12px !important;
+    }
+    th, td {
+        padding: 6px !important;
+    }
+    .rank-btn-link {
+        padding: 6px 8px !important;
+        font-size: 13px !important;
+    }
+    .table-wrapper {
+        overflow-x: auto !important;
+        display: block !important;
+    }
+    /* 固定幅で横スクロール可能にする */
+    .table-wrapper table {
+        width: 1080px !important;
+    }
+}
+</style>
+""", unsafe_allow_html=True)
+
+
 # --- メイン処理 ---
 def main():
     # ページ設定
@@ -406,6 +1201,7 @@ def main():
         page_icon="🎤",
         layout="wide"
     )
+    inject_common_css()
 
     st.markdown(
         "<h1 style='font-size:28px; text-align:left; color:#1f2937;'>🎤 SHOWROOM イベント一覧（簡易版）</h1>",
@@ -477,36 +1273,32 @@ def main():
     
     
     # 選択されたステータスに基づいてイベント情報を取得
-    # 辞書を使って重複を確実に排除
-    unique_events_dict = {}
+    # （正規化・重複除外は get_event_list で取得ごとに1度だけ行われる）
+    all_events = []
+    event_list = None
 
     # --- カウント用の変数を初期化（追加） ---
     fetched_count_raw = 0
     past_count_raw = 0
-    fetched_events = []  # 参照安全のため初期化
     past_events = []     # 参照安全のため初期化
 
+    # 公開スナップショットがあればそれを使い、APIへのアクセスを省略する
+    snapshot = get_published_snapshot()
+
     if selected_statuses:
         with st.spinner("イベント情報を取得中..."):
-            fetched_events = get_events(selected_statuses)
+            event_list = get_event_list(tuple(selected_statuses), snapshot["version"] if snapshot else None)
             # --- API取得分の「生」件数を保持（変更） ---
-            fetched_count_raw = len(fetched_events)
-            for event in fetched_events:
-                # --- 変更: event_id を正規化して辞書キーにする ---
-                eid = normalize_event_id_val(event.get('event_id'))
-                if eid is None:
-                    # 無効なIDはスキップ
-                    continue
-                # イベントオブジェクト内の event_id も正規化して上書きしておく（以降の処理を安定させるため）
-                event['event_id'] = eid
-                # フェッチ元（API）を優先して格納（上書き可）
-                unique_events_dict[eid] = event
+            fetched_count_raw = event_list["raw_count"]
+            all_events = event_list["events"]
     
     # --- 「終了(BU)」のデータ取得 ---
     if use_past_bu:
         with st.spinner("過去のイベントデータを取得・処理中..."):
             past_events = get_past_events_from_files()
             past_count_raw = len(past_events)
+            # 辞書を使って重複を確実に排除（API 取得分を先に格納）
+            unique_events_dict = {e["event_id"]: e for e in all_events}
 
             # ✅ APIで取得した「終了」イベント（status=4）の event_id 一覧を作成
             api_finished_events = []
@@ -545,12 +1337,20 @@ def main():
                     unique_events_dict[eid] = event
 
 
-    # 辞書の値をリストに変換して、フィルタリング処理に進む
-    all_events = list(unique_events_dict.values())
-    
-    # ✅ 特定イベントを完全除外（フィルタ候補にも残らないように）
-    all_events = [e for e in all_events if str(e.get("event_id")) != "12151"]
-    
+            # 辞書の値をリストに変換して、フィルタリング処理に進む
+            all_events = list(unique_events_dict.values())
+
+            # ✅ 特定イベントを完全除外（フィルタ候補にも残らないように）
+            all_events = [e for e in all_events if str(e.get("event_id")) != "12151"]
+
+    # --- バージョンと日付の選択肢（通常は取得結果に計算済みのものを使う） ---
+    if use_past_bu or event_list is None:
+        event_list_version = compute_snapshot_version(all_events)
+        all_start_dates, all_end_dates = collect_event_dates(all_events)
+    else:
+        event_list_version = event_list["version"]
+        all_start_dates, all_end_dates = event_list["start_dates"], event_list["end_dates"]
+
     original_event_count = len(all_events)
 
     # --- 取得前の合計（生）件数とユニーク件数の差分を算出（追加） ---
@@ -567,10 +1367,12 @@ def main():
         # それ以外（＝開催中／開催予定のみ）の場合は昇順（reverse=False）
         reverse_sort = (use_finished or use_past_bu)
 
+        # --- イベント名検索 ---
+        search_query = st.sidebar.text_input("イベント名で検索", placeholder="イベント名・URLキーの一部")
+        normalized_query = normalize_search_text(search_query).strip()
+
         # --- 開始日フィルタの選択肢を生成 ---
-        start_dates = sorted(list(set([
-            datetime.fromtimestamp(e['started_at'], JST).date() for e in all_events if 'started_at' in e
-        ])), reverse=reverse_sort)
+        start_dates = sorted(all_start_dates, reverse=reverse_sort)
 
         # 日付と曜日の辞書を作成
         start_date_options = {
@@ -584,9 +1386,7 @@ def main():
         )
 
         # --- 終了日フィルタの選択肢を生成 ---
-        end_dates = sorted(list(set([
-            datetime.fromtimestamp(e['ended_at'], JST).date() for e in all_events if 'ended_at' in e
-        ])), reverse=reverse_sort)
+        end_dates = sorted(all_end_dates, reverse=reverse_sort)
 
         end_date_options = {
             d.strftime('%Y/%m/%d') + f"({['月', '火', '水', '木', '金', '土', '日'][d.weekday()]})": d
@@ -614,197 +1414,119 @@ def main():
         
 
         
-        # フィルタリングされたイベントリスト
-        filtered_events = all_events
-        
-        if selected_start_dates:
-            # start_date_options を参照する
-            selected_dates_set = {start_date_options[d] for d in selected_start_dates}
-            filtered_events = [
-                e for e in filtered_events
-                if 'started_at' in e and datetime.fromtimestamp(e['started_at'], JST).date() in selected_dates_set
-            ]
-        
-        # ▼▼ 終了日フィルタの処理を追加（ここから追加/修正） ▼▼
-        if selected_end_dates:
-            # end_date_options を参照する
-            selected_dates_set = {end_date_options[d] for d in selected_end_dates}
-            filtered_events = [
-                e for e in filtered_events
-                if 'ended_at' in e and datetime.fromtimestamp(e['ended_at'], JST).date() in selected_dates_set
-            ]
-        # ▲▲ 終了日フィルタの処理を追加（ここまで追加/修正） ▲▲
-
-        if selected_durations:
-            filtered_events = [
-                e for e in filtered_events
-                if get_duration_category(e['started_at'], e['ended_at']) in selected_durations
-            ]
-        
-        if selected_targets:
-            target_map = {"全ライバー": False, "対象者限定": True}
-            selected_target_values = {target_map[t] for t in selected_targets}
-            filtered_events = [
-                e for e in filtered_events
-                if e.get('is_entry_scope_inner') in selected_target_values
-            ]
-        
-        
+        # --- フィルタ結果キャッシュの参照 ---
+        # 同じスナップショット・同じフィルタ条件の描画結果は、全セッションで再利用する
+        snapshot_version = event_list_version
+        cache_scope = (tuple(selected_statuses), use_past_bu)
+        cache_filters = (
+            normalized_query,
+            tuple(sorted(selected_start_dates)), tuple(sorted(selected_end_dates)),
+            tuple(sorted(selected_durations)), tuple(sorted(selected_targets)),
+        )
+        result_cache = get_filter_result_cache()
+        cached_result = result_cache.get(cache_scope, snapshot_version, cache_filters)
+
+        if cached_result is not None:
+            filtered_event_ids, html, csv_bytes = cached_result
+            filtered_count = len(filtered_event_ids)
+        else:
+            # フィルタリングされたイベントリスト
+            filtered_events = all_events
+
+            if normalized_query:
+                if event_list is not None and not use_past_bu:
+                    search_index = event_list["search_index"]
+                else:
+                    search_index = get_event_search_index(snapshot_version, all_events)
+                matched_ids = search_index.search(normalized_query)
+                filtered_events = [e for e in filtered_events if e["event_id"] in matched_ids]
+
+            if selected_start_dates:
+                # start_date_options を参照する
+                selected_dates_set = {start_date_options[d] for d in selected_start_dates}
+                filtered_events = [
+                    e for e in filtered_events
+                    if 'started_at' in e and datetime.fromtimestamp(e['started_at'], JST).date() in selected_dates_set
+                ]
+
+            # ▼▼ 終了日フィルタの処理を追加（ここから追加/修正） ▼▼
+            if selected_end_dates:
+                # end_date_options を参照する
+                selected_dates_set = {end_date_options[d] for d in selected_end_dates}
+                filtered_events = [
+                    e for e in filtered_events
+                    if 'ended_at' in e and datetime.fromtimestamp(e['ended_at'], JST).date() in selected_dates_set
+                ]
+            # ▲▲ 終了日フィルタの処理を追加（ここまで追加/修正） ▲▲
+
+            if selected_durations:
+                filtered_events = [
+                    e for e in filtered_events
+                    if get_duration_category(e['started_at'], e['ended_at']) in selected_durations
+                ]
+
+            if selected_targets:
+                target_map = {"全ライバー": False, "対象者限定": True}
+                selected_target_values = {target_map[t] for t in selected_targets}
+                filtered_events = [
+                    e for e in filtered_events
+                    if e.get('is_entry_scope_inner') in selected_target_values
+                ]
+
+            filtered_event_ids = [e["event_id"] for e in filtered_events]
+            filtered_count = len(filtered_events)
+
         # --- 表示メッセージの改善（汎用的な文言） ---
-        filtered_count = len(filtered_events)
         if use_finished and use_past_bu and duplicates_removed_pre_filter > 0:
             st.success(f"{filtered_count}件のイベントが見つかりました。※重複データが存在した場合は1件のみ表示しています。")
         else:
             st.success(f"{filtered_count}件のイベントが見つかりました。")
-        
+
         st.markdown("---")
 
 
         # ===============================
         # 一覧表示 & CSVダウンロード
         # ===============================
-        import streamlit.components.v1 as components
-        import pandas as pd
-        import base64
-
         st.markdown("##### 📋 一覧表示")
 
-        # --- 追加：参加ルーム数をまとめて高速で取得する ---
-        event_ids = [e["event_id"] for e in filtered_events]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            # 10個同時にAPIを叩く
-            total_entries_list = list(executor.map(get_total_entries, event_ids))
-        
-        # 取得した結果を各イベントデータの中に保存しておく
-        for e, total in zip(filtered_events, total_entries_list):
-            e["total_entries_result"] = total
-        # ----------------------------------------------
-
-        # --- 1. CSVデータの生成 (元の文字化けしないロジックを維持) ---
-        download_data = []
-        for e in filtered_events:
-            download_data.append({
-                "イベント名": e['event_name'],
-                "対象": "対象者限定" if e.get("is_entry_scope_inner") else "全ライバー",
-                "開始": datetime.fromtimestamp(e["started_at"], JST).strftime('%Y/%m/%d %H:%M'),
-                "終了": datetime.fromtimestamp(e["ended_at"], JST).strftime('%Y/%m/%d %H:%M'),
-                "参加ルーム数": e.get("total_entries_result", 0)
-            })
-
-        df_download = pd.DataFrame(download_data)
-        # 前に「大丈夫そう」と言っていただいた「utf-8-sig」のエンコードをそのまま使用
-        csv_bytes = df_download.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
-        b64_csv = base64.b64encode(csv_bytes).decode()
-
-        # --- 2. HTMLの作成 (テーブルとボタンを一体化して隙間を無くす) ---
-        html = f"""
-        <style>
-        .summary-wrapper {{
-            max-height: 80vh;
-            overflow-y: auto;
-            border: 1px solid #d1d5db;
-            /* 下のボタンとの間に少しだけ余白を作る場合はここ */
-            margin-bottom: 0px; 
-        }}
-        .summary-table {{
-            width: 100%;
-            border-collapse: separate;
-            border-spacing: 0;
-            font-size: 0.85rem; 
-            font-family: sans-serif;
-        }}
-
-        /* --- 【修正】表の一番下の線がダブるのを防ぐ --- */
-        .summary-table tbody tr:last-child td {{
-            border-bottom: none;
-        }}
-
-        .summary-table thead th {{
-            background: #f3f4f6;
-            text-align: center;
-            padding: 10px 12px;
-            border-bottom: 1px solid #d1d5db;
-            border-right: 1px solid #d1d5db;
-            position: sticky;
-            top: 0;
-            z-index: 10;
-            white-space: nowrap; 
-        }}
-        .summary-table tbody td {{
-            padding: 8px 12px;
-            border-bottom: 1px solid #e5e7eb;
-            border-right: 1px solid #e5e7eb;
-            white-space: nowrap; 
-        }}
-        .summary-table td:first-child {{
-            white-space: normal;
-            min-width: 250px;
-        }}
-        .summary-table tbody td.col-center {{
-            text-align: center;
-        }}
-        .summary-table thead th:last-child,
-        .summary-table tbody td:last-child {{
-            border-right: none;
-        }}
-
-        /* --- 【修正】ボタンの位置の微調整 --- */
-        .dl-link {{
-            display: inline-flex;
-            align-items: center;
-            padding: 0.4rem 0.8rem;
-            border-radius: 0.5rem;
-            color: #31333F;
-            background-color: #FFFFFF;
-            border: 1px solid #d1d5db;
-            text-decoration: none;
-            font-size: 0.85rem;
-            font-family: sans-serif;
-            
-            /* ここで表との距離を調整します（10px程度が標準的です） */
-            margin-top: 12px; 
-        }}
-        .dl-link:hover {{
-            border-color: #FF4B4B;
-            color: #FF4B4B;
-        }}
-        </style>
-
-        <div class="summary-wrapper">
-            <table class="summary-table">
-                <thead>
-                    <tr>
-                      <th>イベント名</th>
-                      <th>対象</th>
-                      <th>開始</th>
-                      <th>終了</th>
-                      <th>参加ルーム数</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-
-        for e in filtered_events:
-            html += f"""
-                <tr>
-                  <td><a href="{EVENT_PAGE_BASE_URL}{e['event_url_key']}" target="_blank">{e['event_name']}</a></td>
-                  <td class="col-center">{"対象者限定" if e.get("is_entry_scope_inner") else "全ライバー"}</td>
-                  <td class="col-center">{datetime.fromtimestamp(e["started_at"], JST).strftime('%Y/%m/%d %H:%M')}</td>
-                  <td class="col-center">{datetime.fromtimestamp(e["ended_at"], JST).strftime('%Y/%m/%d %H:%M')}</td>
-                  <td class="col-center">{e.get("total_entries_result", 0)}</td>
-                </tr>
-            """
-
-        html += f"""
-                </tbody>
-            </table>
-        </div>
-        <a class="dl-link" href="data:text/csv;base64,{b64_csv}" download="event_list.csv">
-            📊 この内容をCSVでダウンロード
-        </a>
-        """
+        if cached_result is None:
+            # イベント辞書は全セッションで共有されているため、書き込む前にコピーする
+            filtered_events = [dict(e) for e in filtered_events]
+
+            # --- 追加：参加ルーム数をまとめて高速で取得する ---
+            # （スナップショットで解決済みのものは取得しない。公開時に 'N/A' だったものは取り直す）
+            events_to_fetch = [e for e in filtered_events if not isinstance(e.get("total_entries_result"), int)]
+            if events_to_fetch:
+                import concurrent.futures
+                with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+                    # 10個同時にAPIを叩く
+                    total_entries_list = list(executor.map(get_total_entries, [e["event_id"] for e in events_to_fetch]))
+
+                # 取得した結果を各イベントデータの中に保存しておく
+                for e, total in zip(events_to_fetch, total_entries_list):
+                    e["total_entries_result"] = total
+            # ----------------------------------------------
+
+            # --- 開催中イベントは取得した参加ルーム数を推移ストアにも記録する ---
+            trend_store = None
+            if 1 in selected_statuses:
+                trend_store = get_entry_series_store()
+                now_ts = int(time.time())
+                for e in events_to_fetch:
+                    if is_ongoing_event(e, now_ts):
+                        trend_store.record(e["event_id"], e["total_entries_result"], now_ts)
+
+            # --- 1. CSVデータの生成 (元の文字化けしないロジックを維持) ---
+            csv_bytes = build_download_csv(filtered_events)
+
+            # --- 2. HTMLの作成 ---
+            html = build_summary_html(filtered_events, csv_bytes, trend_store)
+
+            result_cache.put(cache_scope, snapshot_version, cache_filters, (filtered_event_ids, html, csv_bytes))
 
         # ボタンまで含めて表示されるよう高さを調整
+        import streamlit.components.v1 as components
         components.html(html, height=800, scrolling=False)
 
             
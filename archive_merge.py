@@ -0,0 +1,180 @@
+"""
+sr-event-archive.csv のマージ（結合＋重複除外）と CSV 化の処理。
+
+Streamlit に依存しないモジュールにしておくことで、プロセスプールのワーカーから
+読み込めるようにしている（app.py はワーカー側で import できないため）。
+pandas は起動を軽くするため、使用する関数の中でだけ import する。
+"""
+import os
+import re
+
+# この行数以上のアーカイブをプロセスプールで処理する（None の場合は常に直列で処理する）。
+# 各フェーズ（ワーカー起動・正規化・CSV 化・親プロセス側の処理）の計測から見積もった損益分岐は
+# 2ワーカーで約45万行、4ワーカーで約30万行（benchmarks/archive_merge_bench.py）。
+# ワーカー起動には streamlit run 時に app.py が __mp_main__ として読み込まれる分（約1秒）を含む。
+# 見積もりにはパイプでの転送などが含まれないため余裕を持たせている。マルチコア環境の実測値で見直すこと
+PARALLEL_MIN_ROWS = 700000
+# ワーカー数の上限
+MAX_WORKERS = 4
+# ワーカーとの受け渡しに使う文字列型（pyarrow のバッファのまま pickle されるため、object 型より転送が速い）
+TRANSFER_STRING_DTYPE = "string[pyarrow]"
+
+
+# --- ヘルパー: event_id 正規化関数（変更点） ---
+def normalize_event_id_val(val):
+    """
+    event_id の型ゆれ（数値、文字列、'123.0' など）を吸収して
+    一貫した文字列キーを返す。
+    戻り値: 正規化された文字列 (例: "123")、無効なら None を返す
+    """
+    if val is None:
+        return None
+    try:
+        # numpy / pandas の数値型も扱えるよう float にして判定
+        # ただし 'abc' のような文字列はそのまま文字列化して返す
+        if isinstance(val, (int,)):
+            return str(val)
+        if isinstance(val, float):
+            if val.is_integer():
+                return str(int(val))
+            return str(val).strip()
+        s = str(val).strip()
+        # もし "123.0" のような表記なら整数に変換して整数表記で返す
+        if re.match(r'^\d+(\.0+)?$', s):
+            return str(int(float(s)))
+        # 普通の数字文字列やキー文字列はトリムしたものを返す
+        if s == "":
+            return None
+        return s
+    except Exception:
+        try:
+            return str(val).strip()
+        except Exception:
+            return None
+
+
+# --- ワーカー側の処理（プロセス間で受け渡すためモジュールの最上位に定義） ---
+def _normalize_chunk(event_ids):
+    """event_id（Series の連続区間）を直列処理と同じ方法で正規化して返す"""
+    return event_ids.apply(normalize_event_id_val).astype(TRANSFER_STRING_DTYPE)
+
+
+def _to_csv_chunk(df):
+    return df.to_csv(index=False, header=False)
+
+
+def _chunk_bounds(total, parts):
+    """0〜total を parts 個以下の連続区間 (開始, 終了) に分割（順序を保つ）"""
+    size = -(-total // parts) if total else 0
+    return [(i, min(i + size, total)) for i in range(0, total, size)] if size else []
+
+
+# --- マージ本体 ---
+def merge_archive_serial(old_df, new_df, progress=None):
+    """
+    既存アーカイブ（old_df）に新規取得分（new_df, event_id 正規化済み）を結合し、
+    event_id の重複を後勝ちで除外して (結合結果, CSVバイト列) を返す。
+    progress には (進捗率 0.0〜1.0, メッセージ) を受け取る関数を渡せる。
+    """
+    import pandas as pd
+
+    def report(value, message):
+        if progress is not None:
+            progress(value, message)
+
+    report(0.0, "event_id を正規化中...")
+    old_df = old_df.copy()
+    old_df["event_id"] = old_df["event_id"].apply(normalize_event_id_val)
+    report(0.4, "重複を除外中...")
+    merged_df = pd.concat([old_df, new_df], ignore_index=True)
+    merged_df.drop_duplicates(subset=["event_id"], keep="last", inplace=True)
+    report(0.5, "CSV を作成中...")
+    csv_bytes = merged_df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+    report(1.0, "マージ完了")
+    return merged_df, csv_bytes
+
+
+def merge_archive_parallel(old_df, new_df, workers, progress=None, executor=None):
+    """
+    merge_archive_serial と同じ結果（CSV はバイト単位で一致）をプロセスプールで求める。
+    old_df と new_df は同じ列を同じ順序で持つこと。
+
+    1. 既存分の event_id 正規化を連続区間に分けて並列実行
+    2. 正規化後の event_id 全体で重複除外（後勝ち）。ベクトル演算で済むため親プロセスで行う
+    3. 残す既存行の CSV 化を連続区間ごとに並列実行し、新規分（少量）は親プロセスで CSV 化して末尾に連結
+       （既存分と新規分を結合すると列が object 型になり転送が重くなるため、結合はワーカーの処理中に行う）
+
+    progress には (進捗率 0.0〜1.0, メッセージ) を受け取る関数を渡せる。
+    executor には計測用に concurrent.futures.Executor 互換のオブジェクトを渡せる（省略時は spawn のプロセスプール）。
+    """
+    import concurrent.futures
+    import multiprocessing
+    import numpy as np
+    import pandas as pd
+
+    def report(value, message):
+        if progress is not None:
+            progress(value, message)
+
+    if executor is None:
+        # Streamlit のサーバープロセス（マルチスレッド）から fork しないよう spawn で起動する
+        ctx = multiprocessing.get_context("spawn")
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    with executor:
+        # 1. event_id 正規化
+        report(0.0, "event_id を正規化中...")
+        event_ids = old_df["event_id"]
+        bounds = _chunk_bounds(len(event_ids), workers)
+        normalized = list(executor.map(_normalize_chunk, [event_ids.iloc[start:stop] for start, stop in bounds]))
+        old_df = old_df.copy()
+        if normalized:
+            old_df["event_id"] = pd.concat(normalized)
+
+        # 2. 重複除外（drop_duplicates(keep="last") と同じく各 event_id の最後の行を残す）
+        report(0.4, "重複を除外中...")
+        all_ids = pd.concat(
+            [old_df["event_id"].astype(TRANSFER_STRING_DTYPE), new_df["event_id"].astype(TRANSFER_STRING_DTYPE)],
+            ignore_index=True,
+        )
+        keep = np.flatnonzero(~all_ids.duplicated(keep="last").to_numpy())
+        split = np.searchsorted(keep, len(old_df))
+        old_kept = old_df.iloc[keep[:split]]
+        new_kept = new_df.iloc[keep[split:] - len(old_df)]
+
+        # 3. CSV 化（既存分はワーカー、新規分と結合結果は親プロセスで並行して作る）
+        report(0.5, "CSV を作成中...")
+        futures = [
+            executor.submit(_to_csv_chunk, old_kept.iloc[start:stop])
+            for start, stop in _chunk_bounds(len(old_kept), workers)
+        ]
+        header = old_df.iloc[0:0].to_csv(index=False)
+        tail = new_kept.to_csv(index=False, header=False)
+        merged_df = pd.concat([old_kept, new_kept])
+        merged_df.index = keep
+        body = []
+        for i, future in enumerate(futures):
+            body.append(future.result())
+            report(0.5 + 0.5 * (i + 1) / len(futures), "CSV を作成中...")
+
+    csv_bytes = (header + "".join(body) + tail).encode("utf-8-sig")
+    report(1.0, "マージ完了")
+    return merged_df, csv_bytes
+
+
+def merge_archive(old_df, new_df, workers=None, progress=None):
+    """
+    アーカイブのマージ。行数が PARALLEL_MIN_ROWS 以上で複数コアを使え、既存分と新規分の列が一致する場合は
+    プロセスプールで、それ以外は直列で処理する（どちらも同じ結果を返す）。
+    progress には (進捗率 0.0〜1.0, メッセージ) を受け取る関数を渡せる。
+    """
+    if workers is None:
+        workers = min(MAX_WORKERS, os.cpu_count() or 1)
+    total_rows = len(old_df) + len(new_df)
+    if (
+        PARALLEL_MIN_ROWS is None
+        or workers <= 1
+        or total_rows < PARALLEL_MIN_ROWS
+        or list(old_df.columns) != list(new_df.columns)
+    ):
+        return merge_archive_serial(old_df, new_df, progress)
+    return merge_archive_parallel(old_df, new_df, workers, progress)
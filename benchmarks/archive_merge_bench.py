@@ -0,0 +1,164 @@
+"""
+アーカイブのマージ（archive_merge.py）の直列処理と並列処理を比較するベンチマーク。
+
+合成したアーカイブで両方を実行し、所要時間を表示するとともに、
+出力 CSV がバイト単位で一致することを確認する（一致しなければ終了コード1）。
+
+あわせて、並列処理の各タスク（ワーカー側の処理。引数・戻り値の pickle を含む）をこのプロセス内で順に実行して
+計測し、「ワーカー起動 + 親プロセス側の処理 + 各フェーズで最も遅いタスク」から
+ワーカー数分のコアがある場合の所要時間を見積もる（コア数の少ない環境でも PARALLEL_MIN_ROWS の目安が分かる）。
+archive_merge.PARALLEL_MIN_ROWS は、並列の方が速くなる行数（マルチコア環境では実測値）から設定する。
+
+使い方:
+    python benchmarks/archive_merge_bench.py                    # 5万 / 20万 / 100万行 + 新規 1,000 行
+    python benchmarks/archive_merge_bench.py --rows 1000000 --workers 8
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import pickle
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_merge import PARALLEL_MIN_ROWS, merge_archive_parallel, merge_archive_serial
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLUMNS = [
+    "event_id", "is_event_block", "is_entry_scope_inner", "event_name",
+    "image_m", "started_at", "ended_at", "event_url_key", "show_ranking",
+]
+
+
+def make_frames(rows, new_rows, seed):
+    """既存アーカイブ（CSV 読み込み相当の文字列列）と新規取得分を生成"""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    old_records = []
+    for i in range(rows):
+        # 型ゆれ（"123.0"）・前後の空白・重複行・欠損を混ぜる
+        eid = rng.randrange(rows)
+        eid_text = rng.choice([f"{eid}", f"{eid}.0", f" {eid} "]) if i % 97 else None
+        started = 1_600_000_000 + eid * 60
+        old_records.append([
+            eid_text, "False", str(i % 3 == 0), f"イベント, \"{eid}\" 第{i}回",
+            f"https://example.com/{eid}.png", str(started), str(started + 86400 * 7),
+            f"event_{eid}", "True",
+        ])
+    old_df = pd.DataFrame(old_records, columns=COLUMNS)
+
+    new_records = []
+    for i in range(new_rows):
+        eid = rows - new_rows // 2 + i
+        started = 1_700_000_000 + i * 60
+        # API の欠損値（None）も混ぜる（数値列は float、真偽値列は object になる）
+        new_records.append([
+            str(eid), False, None if i % 50 == 5 else i % 2 == 0, None if i % 50 == 7 else f"新イベント {eid}",
+            f"https://example.com/{eid}.png", None if i % 50 == 3 else started, started + 86400 * 3,
+            f"new_event_{eid}", True,
+        ])
+    new_df = pd.DataFrame(new_records, columns=COLUMNS)
+    return old_df, new_df
+
+
+class InlineTimingExecutor(concurrent.futures.Executor):
+    """
+    ワーカーに渡すタスクをこのプロセス内で順に実行し、所要時間を記録する Executor。
+    引数・戻り値の pickle のうち、送る側（dumps）と受け取った結果の loads は親プロセス側、
+    引数の loads・タスク本体・結果の dumps はワーカー側の時間として数える。
+    """
+
+    def __init__(self):
+        self.parent_sec = 0.0
+        self.task_sec = collections.defaultdict(list)
+
+    def submit(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        payload = pickle.dumps((args, kwargs))
+        self.parent_sec += time.perf_counter() - started
+
+        started = time.perf_counter()
+        task_args, task_kwargs = pickle.loads(payload)
+        result_payload = pickle.dumps(fn(*task_args, **task_kwargs))
+        self.task_sec[fn.__name__].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        future = concurrent.futures.Future()
+        future.set_result(pickle.loads(result_payload))
+        self.parent_sec += time.perf_counter() - started
+        return future
+
+
+def measure_worker_startup(repeat=3):
+    """
+    ワーカー1つの起動にかかる秒数（最小値）。
+    streamlit run ではスクリプト（app.py）が __main__ として実行されているため、spawn のワーカーは
+    app.py も __mp_main__ として読み込む（main() は呼ばれない）。その import 時間も含めて計測する。
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app, archive_merge, pandas, pyarrow"], cwd=ROOT_DIR, check=True)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def project_parallel(old_df, new_df, workers, startup_sec):
+    """各フェーズのタスクがワーカー数分のコアで同時に動くとした場合の所要時間の見積もり（秒）"""
+    executor = InlineTimingExecutor()
+    started = time.perf_counter()
+    merge_archive_parallel(old_df, new_df, workers, executor=executor)
+    total_sec = time.perf_counter() - started
+    task_total = sum(sum(times) for times in executor.task_sec.values())
+    # 親プロセス側 = 全体 - タスク本体（pickle の親側の分は parent_sec として全体に含まれている）
+    parent_sec = total_sec - task_total
+    slowest = sum(max(times) for times in executor.task_sec.values())
+    return startup_sec + parent_sec + slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="アーカイブマージの直列／並列比較")
+    parser.add_argument("--rows", default="50000,200000,1000000", help="既存アーカイブの行数（カンマ区切り）")
+    parser.add_argument("--new-rows", type=int, default=1_000, help="新規取得分の行数")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="並列処理のワーカー数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    startup_sec = measure_worker_startup()
+    print(f"CPU: {os.cpu_count()} / 現在の PARALLEL_MIN_ROWS: {PARALLEL_MIN_ROWS}"
+          f" / ワーカー起動: {startup_sec:.2f} 秒")
+    failed = False
+    for rows in [int(r) for r in args.rows.split(",") if r.strip()]:
+        old_df, new_df = make_frames(rows, args.new_rows, args.seed)
+
+        started = time.perf_counter()
+        serial_df, serial_csv = merge_archive_serial(old_df, new_df)
+        serial_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        parallel_df, parallel_csv = merge_archive_parallel(old_df, new_df, args.workers)
+        parallel_sec = time.perf_counter() - started
+
+        projected_sec = project_parallel(old_df, new_df, args.workers, startup_sec)
+
+        print(f"{rows + args.new_rows:>9} 行 / 直列: {serial_sec:.2f} 秒 / 並列({args.workers}): {parallel_sec:.2f} 秒"
+              f" / {args.workers}コアでの並列の見積もり: {projected_sec:.2f} 秒 / 出力 {len(serial_df)} 行")
+        if serial_csv != parallel_csv:
+            print("  ❌ 出力 CSV が一致しません。")
+            failed = True
+        elif not parallel_df.index.equals(serial_df.index):
+            print("  ❌ 結合結果の行（インデックス）が一致しません。")
+            failed = True
+        else:
+            print(f"  ✅ 出力 CSV はバイト単位で一致しました（{len(serial_csv)} bytes）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+app.py の import 時間を `python -X importtime` で計測するベンチマーク。
+
+使い方:
+    python benchmarks/import_time.py                 # 計測結果を表示
+    python benchmarks/import_time.py --save          # 結果を import_time_baseline.json に保存
+    python benchmarks/import_time.py --check         # 保存済みの基準値と比較（悪化していれば終了コード1。
+                                                     # 基準値が無い場合は遅延 import の確認のみ）
+
+import 時間の絶対値はマシンや負荷で大きく変わるため、基準値には
+「app 自身の import 時間（streamlit の分を除く）÷ 同じ計測での streamlit の import 時間」の比率を使う。
+
+コールドスタート（コンテナ起動直後の初回表示）とスクリプト再実行を軽く保つため、
+起動時に読み込まれてはいけない重いモジュール（pandas など）が混入していないかも確認する。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_baseline.json")
+
+# import app の時点で app.py が読み込んではいけないモジュール（使用する関数の中で遅延 import する）。
+# streamlit 自身が読み込むもの（バージョンによっては plotly など）は対象外として扱う
+DEFERRED_MODULES = ["pandas", "plotly", "ftplib", "streamlit.components.v1"]
+# 基準値（比率）からの悪化をどこまで許容するか（割合）
+DEFAULT_TOLERANCE = 0.5
+
+
+def run_importtime(module="app"):
+    """別プロセスで `import <module>` を実行し、-X importtime の出力をパースして返す"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} に失敗しました:\n{proc.stderr}")
+
+    # 出力形式: "import time:       self [us] |  cumulative | imported package"
+    modules = {}
+    top_level_total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        indent = len(name) - len(name.lstrip())
+        name = name.strip()
+        modules[name] = int(cumulative_us)
+        # 最上位（インデント1つ）の import だけを合計すると全体の import 時間になる
+        if indent == 1:
+            top_level_total_us += int(cumulative_us)
+    return top_level_total_us, modules
+
+
+def measure(repeat):
+    """
+    repeat 回計測し、以下の中央値と最後の計測のモジュール一覧を返す。
+    app の import 時間、streamlit の import 時間、app 自身の import 時間（streamlit を除く）、
+    app 自身の import 時間の streamlit に対する比率（同じプロセス内の計測同士で求める）
+    """
+    results = []
+    modules = {}
+    for _ in range(repeat):
+        total_us, modules = run_importtime()
+        app_us = modules.get("app", total_us)
+        # app.py は最初に streamlit を import するため、streamlit の分は app の累積時間に含まれる
+        streamlit_us = modules.get("streamlit", 0)
+        self_us = app_us - streamlit_us
+        results.append((app_us, streamlit_us, self_us, self_us / streamlit_us if streamlit_us else 0.0))
+    medians = [statistics.median(values) for values in zip(*results)]
+    return medians, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py の import 時間ベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（中央値を採用）")
+    parser.add_argument("--top", type=int, default=15, help="表示する重いモジュールの件数")
+    parser.add_argument("--save", action="store_true", help="計測結果を基準値として保存")
+    parser.add_argument("--check", action="store_true", help="保存済みの基準値と比較")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="許容する悪化の割合")
+    args = parser.parse_args()
+
+    (app_us, streamlit_us, self_us, ratio), modules = measure(args.repeat)
+
+    print(f"import app: {app_us / 1000:.1f} ms (うち streamlit {streamlit_us / 1000:.1f} ms /"
+          f" app 自身 {self_us / 1000:.1f} ms, {args.repeat}回の中央値)")
+    print(f"app 自身 / streamlit の比率: {ratio:.3f}")
+    print(f"--- 累積時間の大きいモジュール上位{args.top}件 ---")
+    for name, cumulative_us in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f} ms  {name}")
+
+    failed = False
+    _, streamlit_modules = run_importtime("streamlit")
+    loaded_deferred = [m for m in DEFERRED_MODULES if m in modules and m not in streamlit_modules]
+    if loaded_deferred:
+        print(f"⚠️ 起動時に読み込まれています（遅延 import 対象）: {', '.join(loaded_deferred)}")
+        failed = True
+
+    if args.save:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"app_self_ratio": round(ratio, 3), "python": sys.version.split()[0]}, f, indent=2)
+            f.write("\n")
+        print(f"基準値を保存しました: {BASELINE_PATH}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            # 基準値が無い環境では、遅延 import 対象の混入チェックだけを行う
+            print("基準値ファイルがないため、時間の比較は省略します（--save で作成できます）。")
+        else:
+            with open(BASELINE_PATH, encoding="utf-8") as f:
+                baseline_ratio = json.load(f)["app_self_ratio"]
+            limit_ratio = baseline_ratio * (1 + args.tolerance)
+            print(f"基準値（比率）: {baseline_ratio:.3f} / 許容上限: {limit_ratio:.3f}")
+            if ratio > limit_ratio:
+                print("❌ app 自身の import 時間が基準値を超えています。")
+                failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+"""
+同時接続セッションを想定した app.py の負荷試験ツール。
+
+実際に `streamlit run app.py` でサーバーを1つ起動し、N 個のヘッドレスなクライアントが
+WebSocket（/_stcore/stream）で同時に接続して、ブラウザと同じ BackMsg / ForwardMsg で操作する。
+SHOWROOM API と mksoul はローカルのスタブ HTTP サーバーで代替し、
+app.py の接続先は環境変数 SR_SHOWROOM_BASE_URL / SR_MKSOUL_BASE_URL でスタブに向ける。
+セッション数ごとにサーバーを起動し直し、キャッシュが空の状態から計測する
+（st.cache_data / st.cache_resource は同じサーバーの全セッションで共有される）。
+
+使い方:
+    python benchmarks/load_test.py                              # 1, 5, 10, 25 セッションで計測
+    python benchmarks/load_test.py --sessions 1,10,50 --events 500 --stub-latency 0.1
+    python benchmarks/load_test.py --snapshot                   # 公開スナップショットがある場合を計測
+
+セッション数ごとに以下を表示する:
+    - 再実行（rerun）1回あたりの所要時間 p50 / p95 / p99
+    - スタブが受けた外部リクエスト数（合計・セッションあたり・rerunあたり・エンドポイント別）
+    - Streamlit サーバープロセスのメモリ使用量（RSS）: 接続前・全セッション終了後・セッションあたりの増加分
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+
+SHOWROOM_HOST = "www.showroom-live.com"
+MKSOUL_HOST = "mksoul-pro.com"
+# 1ページあたりのイベント数（SHOWROOM の event/search と同程度）
+EVENTS_PER_PAGE = 30
+
+# 1セッション内で順番に行う操作（初回表示の後、先頭から reruns 回分を実行）
+SCENARIO = [
+    ("multiselect", "期間でフィルタ", "1週間"),
+    ("multiselect", "対象でフィルタ", "全ライバー"),
+    ("text_input", "イベント名で検索", "テストイベント 1-1"),
+    ("checkbox", "開催予定", None),
+    ("multiselect", "期間でフィルタ", "2週間"),
+    ("checkbox", "開催中", None),
+]
+
+
+# --- スタブ ---
+class StubServer:
+    """SHOWROOM API / mksoul のレスポンスをローカルの HTTP サーバーで返し、外部リクエスト数を数える"""
+
+    def __init__(self, event_count, latency, publish_snapshot=False):
+        self.event_count = event_count
+        self.latency = latency
+        self.publish_snapshot = publish_snapshot
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._servers = []
+        now = int(time.time())
+        self._events = {}
+        for status in (1, 3, 4):
+            events = []
+            for i in range(event_count):
+                event_id = status * 1_000_000 + i
+                if status == 1:
+                    started, ended = now - 86400 * (i % 5 + 1), now + 86400 * (i % 9 + 1)
+                elif status == 3:
+                    started, ended = now + 86400 * (i % 7 + 1), now + 86400 * (i % 7 + 3 + i % 12)
+                else:
+                    started, ended = now - 86400 * (i % 20 + 10), now - 86400 * (i % 9 + 1)
+                events.append({
+                    "event_id": event_id,
+                    "event_name": f"テストイベント {status}-{i}",
+                    "event_url_key": f"stub_event_{event_id}",
+                    "is_entry_scope_inner": i % 3 == 0,
+                    "started_at": started,
+                    "ended_at": ended,
+                    "image_m": "",
+                    "is_event_block": False,
+                    "show_ranking": True,
+                })
+            self._events[status] = events
+
+        # update_archive_file の publish_event_snapshot と同じ形式のスナップショット
+        self.snapshot_version = f"{now}-stub"
+        self.snapshot_json = json.dumps({
+            "version": self.snapshot_version,
+            "generated_at": now,
+            "columns": ["event_id", "event_name", "event_url_key", "is_entry_scope_inner",
+                        "started_at", "ended_at", "status", "total_entries"],
+            "rows": [
+                [str(e["event_id"]), e["event_name"], e["event_url_key"], e["is_entry_scope_inner"],
+                 e["started_at"], e["ended_at"], status, e["event_id"] % 500]
+                for status, events in self._events.items() for e in events
+            ],
+        }, ensure_ascii=False)
+
+    def start(self):
+        """SHOWROOM 用と mksoul 用の HTTP サーバーを別スレッドで起動し、それぞれのベース URL を返す"""
+        base_urls = {}
+        for host in (SHOWROOM_HOST, MKSOUL_HOST):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), partial(StubHandler, self, host))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+            base_urls[host] = f"http://127.0.0.1:{server.server_address[1]}"
+        return base_urls
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def snapshot_counts(self):
+        with self._lock:
+            return collections.Counter(self.counts)
+
+    def respond(self, host, path, query):
+        """(ステータスコード, Content-Type, 本文) を返す"""
+        with self._lock:
+            self.counts[f"{host}{path}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if host == SHOWROOM_HOST and path == "/api/event/search":
+            events = self._events.get(int(query.get("status", 0)), [])
+            page = int(query.get("page", 1))
+            start = (page - 1) * EVENTS_PER_PAGE
+            return 200, "application/json", json.dumps({"event_list": events[start:start + EVENTS_PER_PAGE]})
+        if host == SHOWROOM_HOST and path == "/api/event/room_list":
+            event_id = int(query.get("event_id", 0))
+            return 200, "application/json", json.dumps({"total_entries": event_id % 500, "list": []})
+        if host == MKSOUL_HOST and path.endswith("sr-event-snapshot-version.txt"):
+            if not self.publish_snapshot:
+                return 404, "text/plain", ""
+            return 200, "text/plain", self.snapshot_version
+        if host == MKSOUL_HOST and path.endswith("sr-event-snapshot.json"):
+            if not self.publish_snapshot:
+                return 404, "text/plain", ""
+            return 200, "application/json", self.snapshot_json
+        if host == MKSOUL_HOST:
+            return 200, "text/csv", "\ufeffevent_id,event_name\n"
+        return 404, "text/plain", ""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def __init__(self, stub, host, *args, **kwargs):
+        self.stub = stub
+        self.host = host
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        status, content_type, text = self.stub.respond(self.host, parsed.path, query)
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --- Streamlit サーバー ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_streamlit(base_urls, timeout, log_file):
+    """app.py を `streamlit run` で起動し、ヘルスチェックが通るまで待って (プロセス, ポート) を返す"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "SR_SHOWROOM_BASE_URL": base_urls[SHOWROOM_HOST],
+        "SR_MKSOUL_BASE_URL": base_urls[MKSOUL_HOST],
+        # サンプラーのバックグラウンド取得は計測対象外にする
+        "SR_ENTRY_SAMPLER": env.get("SR_ENTRY_SAMPLER", "0"),
+    })
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH,
+         "--server.headless=true", "--server.address=127.0.0.1", f"--server.port={port}",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        cwd=ROOT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit が終了しました（ログ: {log_file.name}）")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).status_code == 200:
+                return proc, port
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit の起動がタイムアウトしました（ログ: {log_file.name}）")
+
+
+def stop_streamlit(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# --- ヘッドレスクライアント ---
+class HeadlessSession:
+    """
+    ブラウザの代わりに WebSocket で1セッション分の操作を行うクライアント。
+    受け取った ForwardMsg からウィジェットを集め、操作ごとに全ウィジェットの状態を送って再実行させる。
+    """
+
+    def __init__(self, url, timeout):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.url = url
+        self.timeout = timeout
+        self.script_finished = ForwardMsg.ScriptFinishedStatus
+        self.widgets = {}       # (種類, ラベル) -> 最後に受け取ったウィジェットの proto
+        self.states = {}        # ウィジェット id -> 送信する WidgetState
+        self.page_script_hash = ""
+        self.errors = []
+
+    def _current_value(self, kind, widget):
+        state = self.states.get(widget.id)
+        if kind == "checkbox":
+            return state.bool_value if state is not None else widget.default
+        if kind == "multiselect":
+            if state is not None:
+                return list(state.string_array_value.data)
+            return [widget.options[i] for i in widget.default]
+        return state.string_value if state is not None else widget.default
+
+    def _set_state(self, kind, widget, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=widget.id)
+        if kind == "checkbox":
+            state.bool_value = value
+        elif kind == "multiselect":
+            state.string_array_value.data.extend(value)
+        else:
+            state.string_value = value
+        self.states[widget.id] = state
+
+    def apply_step(self, step):
+        """シナリオの1操作を、送信するウィジェットの状態に反映"""
+        kind, label, option = step
+        widget = self.widgets[(kind, label)]
+        if kind == "checkbox":
+            self._set_state(kind, widget, not self._current_value(kind, widget))
+        elif kind == "multiselect":
+            selected = self._current_value(kind, widget)
+            if option not in selected:
+                selected.append(option)
+            self._set_state(kind, widget, selected)
+        else:
+            self._set_state(kind, widget, option)
+
+    def _handle_element(self, element):
+        kind = element.WhichOneof("type")
+        if kind in ("checkbox", "multiselect", "text_input"):
+            widget = getattr(element, kind)
+            self.widgets[(kind, widget.label)] = widget
+            # on_change などでサーバー側が値を変えた場合はその値を引き継ぐ（ブラウザと同じ）
+            if widget.set_value:
+                value = list(widget.raw_values) if kind == "multiselect" else widget.value
+                self._set_state(kind, widget, value)
+        elif kind == "exception":
+            self.errors.append(element.exception.message)
+
+    async def rerun(self, ws):
+        """現在のウィジェットの状態で再実行を要求し、スクリプトの実行完了までの秒数を返す"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        back_msg = BackMsg()
+        back_msg.rerun_script.query_string = ""
+        back_msg.rerun_script.page_script_hash = self.page_script_hash
+        back_msg.rerun_script.widget_states.widgets.extend(self.states.values())
+
+        started = time.perf_counter()
+        await ws.send(back_msg.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(ws.recv(), self.timeout))
+            msg_type = msg.WhichOneof("type")
+            if msg_type == "new_session":
+                self.page_script_hash = msg.new_session.page_script_hash
+            elif msg_type == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._handle_element(msg.delta.new_element)
+            elif msg_type == "script_finished":
+                if msg.script_finished == self.script_finished.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if msg.script_finished == self.script_finished.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append("script compile error")
+                return time.perf_counter() - started
+
+    async def run(self, reruns, start_event, latencies):
+        """1セッション分（初回表示＋reruns 回の操作）を実行し、各 rerun の所要時間を記録"""
+        import websockets
+
+        steps = [None] + [SCENARIO[i % len(SCENARIO)] for i in range(reruns)]
+        try:
+            async with websockets.connect(self.url, subprotocols=["streamlit"], max_size=None,
+                                          open_timeout=self.timeout) as ws:
+                # 全セッションの接続がそろってから一斉に開始する
+                await start_event.wait()
+                for step in steps:
+                    if step is not None:
+                        self.apply_step(step)
+                    latencies.append(await self.rerun(ws))
+        except Exception as e:
+            self.errors.append(repr(e))
+
+
+async def run_clients(url, sessions, reruns, timeout):
+    """sessions 個のクライアントを同時に動かし、(rerun の所要時間, エラー, 経過秒数) を返す"""
+    start_event = asyncio.Event()
+    latencies = []
+    clients = [HeadlessSession(url, timeout) for _ in range(sessions)]
+    tasks = [asyncio.create_task(c.run(reruns, start_event, latencies)) for c in clients]
+    # 接続（WebSocket のハンドシェイク）が済むのを待ってから開始
+    await asyncio.sleep(0.5)
+    started = time.perf_counter()
+    start_event.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return latencies, [e for c in clients for e in c.errors], elapsed
+
+
+# --- 計測 ---
+def process_rss_kb(pid):
+    """指定プロセスの RSS（KB）"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def run_level(stub, base_urls, sessions, reruns, timeout):
+    """streamlit サーバーを起動し直して sessions 個のセッションを同時に実行し、結果を集計して返す"""
+    with tempfile.NamedTemporaryFile("w", prefix="load_test_streamlit_", suffix=".log", delete=False) as log_file:
+        proc, port = start_streamlit(base_urls, timeout, log_file)
+        try:
+            counts_before = stub.snapshot_counts()
+            rss_before = process_rss_kb(proc.pid)
+            latencies, errors, elapsed = asyncio.run(
+                run_clients(f"ws://127.0.0.1:{port}/_stcore/stream", sessions, reruns, timeout)
+            )
+            rss_after = process_rss_kb(proc.pid)
+            counts = stub.snapshot_counts() - counts_before
+        finally:
+            stop_streamlit(proc)
+    os.unlink(log_file.name)
+
+    total_requests = sum(counts.values())
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "elapsed": elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "requests": total_requests,
+        "requests_per_session": total_requests / sessions,
+        "requests_per_rerun": total_requests / max(1, len(latencies)),
+        "by_endpoint": counts,
+        "rss_before_kb": rss_before,
+        "rss_after_kb": rss_after,
+        "rss_per_session_kb": (rss_after - rss_before) / sessions,
+        "errors": errors,
+    }
+
+
+def print_result(r):
+    print(f"=== {r['sessions']} セッション（rerun {r['reruns']} 回, {r['elapsed']:.1f} 秒） ===")
+    print(f"  rerun 所要時間: p50 {r['p50'] * 1000:.0f} ms / p95 {r['p95'] * 1000:.0f} ms / p99 {r['p99'] * 1000:.0f} ms")
+    print(f"  外部リクエスト: 合計 {r['requests']} / セッションあたり {r['requests_per_session']:.1f}"
+          f" / rerunあたり {r['requests_per_rerun']:.1f}")
+    for endpoint, count in r["by_endpoint"].most_common():
+        print(f"    {count:8d}  {endpoint}")
+    print(f"  サーバーのメモリ(RSS): 接続前 {r['rss_before_kb'] / 1024:.1f} MB → 終了後 {r['rss_after_kb'] / 1024:.1f} MB"
+          f" / セッションあたり +{r['rss_per_session_kb'] / 1024:.2f} MB")
+    if r["errors"]:
+        print(f"  ⚠️ エラー {len(r['errors'])} 件（先頭: {r['errors'][0]}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py の同時接続負荷試験")
+    parser.add_argument("--sessions", default="1,5,10,25", help="同時セッション数（カンマ区切り）")
+    parser.add_argument("--reruns", type=int, default=3, help="初回表示後に行う操作（rerun）の回数")
+    parser.add_argument("--events", type=int, default=300, help="スタブが返すステータスごとのイベント数")
+    parser.add_argument("--stub-latency", type=float, default=0.02, help="スタブの応答遅延（秒）")
+    parser.add_argument("--snapshot", action="store_true", help="公開スナップショットがある状態で計測")
+    parser.add_argument("--timeout", type=float, default=120, help="1回の rerun のタイムアウト（秒）")
+    args = parser.parse_args()
+
+    stub = StubServer(args.events, args.stub_latency, args.snapshot)
+    base_urls = stub.start()
+    try:
+        for sessions in [int(s) for s in args.sessions.split(",") if s.strip()]:
+            print_result(run_level(stub, base_urls, sessions, args.reruns, args.timeout))
+    finally:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
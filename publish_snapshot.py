@@ -0,0 +1,33 @@
+"""
+閲覧用スナップショット（sr-event-snapshot.json）だけを作り直して公開するスクリプト。
+
+app.py は SNAPSHOT_MAX_AGE（600秒）より古いスナップショットを使わずに API からの取得に戻るため、
+アーカイブ更新（update_archive_file）とは別に、これより短い間隔で定期実行する。
+FTP の接続情報は app と同じ .streamlit/secrets.toml から読み込むので、app.py と同じディレクトリで実行すること。
+
+使い方:
+    python publish_snapshot.py
+
+cron の例（5分ごと）:
+    */5 * * * * cd /path/to/sr-event-list-basic && python publish_snapshot.py >> publish_snapshot.log 2>&1
+"""
+import sys
+from datetime import datetime
+
+import app
+
+
+def main():
+    started = datetime.now(app.JST).strftime("%Y/%m/%d %H:%M:%S")
+    try:
+        result = app.run_snapshot_publish()
+    except Exception as e:
+        print(f"[{started}] ❌ スナップショットの公開に失敗しました: {e}", file=sys.stderr)
+        return 1
+    print(f"[{started}] ✅ スナップショット公開完了: {result['rows']}件"
+          f"（{result['size'] // 1024}KB, version {result['version']}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())